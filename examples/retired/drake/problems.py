@@ -38,6 +38,9 @@ STOVE_PATH = os.path.join(MODELS_DIR, "stove.sdf")
 BROCCOLI_PATH = os.path.join(MODELS_DIR, "broccoli.sdf")
 WALL_PATH = os.path.join(MODELS_DIR, "wall.sdf")
 
+INITIAL_CONF = [0, 0.6 - np.pi / 6, 0, -1.75, 0, 1.0, 0]
+#INITIAL_CONF[1] += np.pi / 6
+
 ##################################################
 
 class Surface(object):
@@ -132,14 +135,12 @@ def load_station(time_step=0.0, **kwargs):
     door_names = ['left_door', 'right_door']
     doors = [plant.GetBodyByName(name).index() for name in door_names]
 
-    initial_conf = [0, 0.6 - np.pi / 6, 0, -1.75, 0, 1.0, 0]
-    #initial_conf[1] += np.pi / 6
     initial_positions = {
         plant.GetJointByName('left_door_hinge'): -DOOR_CLOSED,
         #plant.GetJointByName('left_door_hinge'): -np.pi / 2,
         plant.GetJointByName('right_door_hinge'): np.pi/2,
     }
-    initial_positions.update(zip(get_movable_joints(plant, robot), initial_conf))
+    initial_positions.update(zip(get_movable_joints(plant, robot), INITIAL_CONF))
 
     initial_poses = {
         brick: create_transform(translation=[0.3, 0, 0], rotation=[0, 0, np.pi/2]),
@@ -239,9 +240,7 @@ def load_manipulation(time_step=0.0, use_meshcat=True, use_controllers=True, use
         #plant.GetJointByName('right_door_hinge'): door_position,
         plant.GetJointByName('right_door_hinge'): np.pi/2,
     }
-    initial_conf = [0, 0.6 - np.pi / 6, 0, -1.75, 0, 1.0, 0]
-    #initial_conf[1] += np.pi / 6
-    initial_positions.update(zip(get_movable_joints(plant, robot), initial_conf))
+    initial_positions.update(zip(get_movable_joints(plant, robot), INITIAL_CONF))
 
     initial_poses = {
         #brick: create_transform(translation=[0.6, 0, 0]),
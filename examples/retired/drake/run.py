@@ -2,6 +2,7 @@ from __future__ import print_function
 
 import argparse
 import cProfile
+import importlib
 import pstats
 import random
 
@@ -12,9 +13,8 @@ from examples.drake.generators import Pose, Conf, get_grasp_gen_fn, get_ik_gen_f
 from examples.drake.iiwa_utils import get_door_positions, DOOR_OPEN
 from examples.drake.simulation import compute_duration, convert_splines, step_trajectories, \
     simulate_splines
-from examples.drake.problems import PROBLEMS
 from examples.drake.systems import RenderSystemWithGraphviz
-from examples.drake.utils import get_world_pose, get_configuration, \
+from examples.drake.utils import get_world_poses, get_configuration, \
     get_model_name, get_joint_positions, get_parent_joints, \
     get_state, set_state, get_movable_joints
 from pddlstream.algorithms.focused import solve_focused
@@ -34,6 +34,20 @@ from pddlstream.utils import read, INF, get_file_path
 # Converting from URDF to SDF
 # gz sdf -p ../urdf/iiwa14_polytope_collision.urdf > /iiwa14_polytope_collision.sdf
 
+# Lazy registry: the chosen loader is resolved only after argparse, so the
+# unused problems' models are never touched
+PROBLEMS = {
+    'load_tables': 'examples.drake.problems:load_tables',
+    'load_manipulation': 'examples.drake.problems:load_manipulation',
+    'load_station': 'examples.drake.problems:load_station',
+}
+
+def problem_fn_from_name(name):
+    if name not in PROBLEMS:
+        raise ValueError(name)
+    module_name, _, fn_name = PROBLEMS[name].partition(':')
+    return getattr(importlib.import_module(module_name), fn_name)
+
 ##################################################
 
 def get_pddlstream_problem(task, context, collisions=True):
@@ -45,6 +59,13 @@ def get_pddlstream_problem(task, context, collisions=True):
     robot = task.robot
     robot_name = get_model_name(plant, robot)
 
+    # get_model_name crosses into Drake's C++ bindings; look up each model once
+    name_cache = {}
+    def model_name(model):
+        if model not in name_cache:
+            name_cache[model] = get_model_name(plant, model)
+        return name_cache[model]
+
     world = plant.world_frame() # mbp.world_body()
     robot_joints = get_movable_joints(plant, robot)
     robot_conf = Conf(robot_joints, get_configuration(plant, context, robot))
@@ -59,57 +80,60 @@ def get_pddlstream_problem(task, context, collisions=True):
     if task.reset_robot:
         goal_literals.append(('AtConf', robot_name, robot_conf),)
 
+    world_pose_from_model = get_world_poses(plant, context, task.movable)
     for obj in task.movable:
-        obj_name = get_model_name(plant, obj)
+        obj_name = model_name(obj)
         #obj_frame = get_base_body(mbp, obj).body_frame()
-        obj_pose = Pose(plant, world, obj, get_world_pose(plant, context, obj)) # get_relative_transform
-        init += [('Graspable', obj_name),
-                 ('Pose', obj_name, obj_pose),
-                 #('InitPose', obj_name, obj_pose),
-                 ('AtPose', obj_name, obj_pose)]
-        for surface in task.surfaces:
-            init += [('Stackable', obj_name, surface)]
-            # TODO: detect already stacked
+        obj_pose = Pose(plant, world, obj, world_pose_from_model[obj]) # get_relative_transform
+        init.extend([('Graspable', obj_name),
+                     ('Pose', obj_name, obj_pose),
+                     #('InitPose', obj_name, obj_pose),
+                     ('AtPose', obj_name, obj_pose)])
+        init.extend(('Stackable', obj_name, surface) for surface in task.surfaces)
+        # TODO: detect already stacked
 
     for surface in task.surfaces:
-        surface_name = get_model_name(plant, surface.model_index)
+        surface_name = model_name(surface.model_index)
         if 'sink' in surface_name:
-            init += [('Sink', surface)]
+            init.append(('Sink', surface))
         if 'stove' in surface_name:
-            init += [('Stove', surface)]
+            init.append(('Stove', surface))
 
     for door in task.doors:
         door_body = plant.tree().get_body(door)
         door_name = door_body.name()
         door_joints = get_parent_joints(plant, door_body)
         door_conf = Conf(door_joints, get_joint_positions(door_joints, context))
-        init += [
+        init.extend([
             ('Door', door_name),
             ('Conf', door_name, door_conf),
             ('AtConf', door_name, door_conf),
-        ]
+        ])
         for positions in [get_door_positions(door_body, DOOR_OPEN)]:
             conf = Conf(door_joints, positions)
-            init += [('Conf', door_name, conf)]
+            init.append(('Conf', door_name, conf))
         if task.reset_doors:
-            goal_literals += [('AtConf', door_name, door_conf)]
+            goal_literals.append(('AtConf', door_name, door_conf))
 
     for obj, transform in task.goal_poses.items():
-        obj_name = get_model_name(plant, obj)
+        obj_name = model_name(obj)
         obj_pose = Pose(plant, world, obj, transform)
-        init += [('Pose', obj_name, obj_pose)]
+        init.append(('Pose', obj_name, obj_pose))
         goal_literals.append(('AtPose', obj_name, obj_pose))
     for obj in task.goal_holding:
-        goal_literals.append(('Holding', robot_name, get_model_name(plant, obj)))
+        goal_literals.append(('Holding', robot_name, model_name(obj)))
     for obj, surface in task.goal_on:
-        goal_literals.append(('On', get_model_name(plant, obj), surface))
+        goal_literals.append(('On', model_name(obj), surface))
     for obj in task.goal_cooked:
-        goal_literals.append(('Cooked', get_model_name(plant, obj)))
+        goal_literals.append(('Cooked', model_name(obj)))
 
     goal = And(*goal_literals)
     print('Initial:', init)
     print('Goal:', goal)
 
+    # The two collision predicates differ only in their signatures, so they
+    # can share a single test closure
+    collision_test = get_collision_test(task, context, collisions=collisions)
     stream_map = {
         #'sample-pose': from_gen_fn(get_stable_gen(task, context, collisions=collisions)),
         'sample-reachable-pose': from_gen_fn(get_reachable_pose_gen_fn(task, context, collisions=collisions)),
@@ -117,8 +141,8 @@ def get_pddlstream_problem(task, context, collisions=True):
         'plan-ik': from_gen_fn(get_ik_gen_fn(task, context, collisions=collisions)),
         'plan-motion': from_fn(get_motion_fn(task, context, collisions=collisions)),
         'plan-pull': from_fn(get_pull_fn(task, context, collisions=collisions)),
-        'TrajPoseCollision': get_collision_test(task, context, collisions=collisions),
-        'TrajConfCollision': get_collision_test(task, context, collisions=collisions),
+        'TrajPoseCollision': collision_test,
+        'TrajConfCollision': collision_test,
     }
     #stream_map = 'debug' # Runs PDDLStream with "placeholder streams" for debugging
 
@@ -149,19 +173,22 @@ def postprocess_plan(mbp, gripper, plan):
     return trajectories
 
 
-def plan_trajectories(task, context, collisions=True, max_time=180):
+def plan_trajectories(task, context, collisions=True, max_time=180, profile=False):
     stream_info = {
         'TrajPoseCollision': FunctionInfo(p_success=1e-3, eager=False),
         'TrajConfCollision': FunctionInfo(p_success=1e-3, eager=False),
     }
     problem = get_pddlstream_problem(task, context, collisions=collisions)
-    pr = cProfile.Profile()
-    pr.enable()
+    pr = None
+    if profile: # cProfile itself slows the Python-heavy planning loops
+        pr = cProfile.Profile()
+        pr.enable()
     solution = solve_focused(problem, stream_info=stream_info, planner='ff-wastar2',
                              success_cost=INF, max_time=max_time, debug=False,
                              unit_efforts=True, effort_weight=1, search_sample_ratio=0)
-    pr.disable()
-    pstats.Stats(pr).sort_stats('tottime').print_stats(5)
+    if pr is not None:
+        pr.disable()
+        pstats.Stats(pr).sort_stats('tottime').print_stats(5)
     print_solution(solution)
     plan, cost, evaluations = solution
     if plan is None:
@@ -186,13 +213,11 @@ def main(deterministic=False):
     parser.add_argument('-c', '--cfree', action='store_true', help='Disables collisions when planning')
     parser.add_argument('-v', '--visualizer', action='store_true', help='Use the drake visualizer')
     parser.add_argument('-s', '--simulate', action='store_true', help='Simulates the system')
+    parser.add_argument('--profile', action='store_true', help='Profiles the planner')
     args = parser.parse_args()
 
-    problem_fn_from_name = {fn.__name__: fn for fn in PROBLEMS}
-    if args.problem not in problem_fn_from_name:
-        raise ValueError(args.problem)
     print('Problem:', args.problem)
-    problem_fn = problem_fn_from_name[args.problem]
+    problem_fn = problem_fn_from_name(args.problem)
 
     meshcat_vis = None
     if not args.visualizer:
@@ -217,7 +242,7 @@ def main(deterministic=False):
     task.set_initial()
     task.publish()
     initial_state = get_state(plant, context)
-    trajectories = plan_trajectories(task, context, collisions=not args.cfree)
+    trajectories = plan_trajectories(task, context, collisions=not args.cfree, profile=args.profile)
     if trajectories is None:
         return
 
@@ -251,6 +251,17 @@ def get_world_pose(mbp, context, model_index):
     return mbp.tree().EvalBodyPoseInWorld(context, body)
 
 
+def get_world_poses(mbp, context, model_indices):
+    # One kinematics sweep and one pass over the bodies, instead of a
+    # per-model EvalBodyPoseInWorld plus base-body scan
+    body_poses = mbp.tree().CalcAllBodyPosesInWorld(context)
+    base_body_from_model = {}
+    for body in get_bodies(mbp):
+        base_body_from_model.setdefault(body.model_instance(), body)
+    return {model_index: body_poses[int(base_body_from_model[model_index].index())]
+            for model_index in model_indices}
+
+
 def set_world_pose(mbp, context, model_index, world_pose):
     body = get_base_body(mbp, model_index)
     mbp.tree().SetFreeBodyPoseOrThrow(body, world_pose, context)
@@ -4,9 +4,9 @@ from itertools import product
 
 from pddlstream.algorithms.common import COMPLEXITY_OP
 from pddlstream.algorithms.relation import compute_order, Relation, solve_satisfaction
-from pddlstream.language.constants import is_parameter
+from pddlstream.language.constants import is_parameter, get_prefix, get_args
 from pddlstream.language.conversion import is_atom, head_from_fact
-from pddlstream.utils import safe_zip, HeapElement, safe_apply_mapping
+from pddlstream.utils import INF, safe_zip, HeapElement, safe_apply_mapping
 
 USE_RELATION = True
 
@@ -18,38 +18,90 @@ def is_instance(atom, schema):
             all(is_parameter(b) or (a == b)
                 for a, b in safe_zip(atom.args, schema.args))
 
+_UNASSIGNED = object()
+
 def test_mapping(atoms1, atoms2):
+    # Matching atoms have equal arities (enforced per slot by add_atom),
+    # so plain zip avoids safe_zip's length validation in the inner loop
     mapping = {}
-    for a1, a2 in safe_zip(atoms1, atoms2):
+    for a1, a2 in zip(atoms1, atoms2):
         assert a1.function == a2.function
-        for arg1, arg2 in safe_zip(a1.args, a2.args):
-            if mapping.get(arg1, arg2) == arg2:
+        for arg1, arg2 in zip(a1.args, a2.args):
+            existing = mapping.get(arg1, _UNASSIGNED)
+            if existing is _UNASSIGNED:
                 mapping[arg1] = arg2
-            else:
+            elif existing != arg2:
                 return None
     return mapping
 
+
 ##################################################
 
 # http://citeseerx.ist.psu.edu/viewdoc/download?doi=10.1.1.43.7049&rep=rep1&type=pdf
 
 class Instantiator(Sized): # Dynamic Instantiator
-    def __init__(self, streams, evaluations={}, verbose=False):
+    # No per-instance __dict__: the instantiator sits on the hot loop and
+    # only ever carries this fixed set of tables
+    __slots__ = ['streams', 'verbose', 'queue', 'num_pushes', 'seen_instances',
+                 'complexity_from_atom', 'atoms_from_domain', 'slots_from_predicate',
+                 'shared_groups_from_stream', 'input_positions_from_stream',
+                 'domain_from_stream', 'max_instances_per_call']
+    def __init__(self, streams, evaluations={}, verbose=False, max_instances_per_call=INF):
         # TODO: lazily instantiate upon demand
         self.streams = streams
         self.verbose = verbose
+        # Caps how many new instances a single atom insertion may enqueue,
+        # bounding queue growth on long-horizon problems; the complexity
+        # heap already pops the most promising instances first
+        self.max_instances_per_call = max_instances_per_call
         #self.streams_from_atom = defaultdict(list)
         self.queue = []
         self.num_pushes = 0 # shared between the queues
+        # Insertion-ordered set (dict values are unused): an instance reached
+        # through several combos is only pushed once upon discovery, while
+        # push_instance remains available to callers for deliberate re-pushes
+        self.seen_instances = {}
         # TODO: rename atom to head in most places
-        self.complexity_from_atom = {}
+        # Bucketed by predicate so membership tests hash only the args tuple,
+        # keyed identically to slots_from_predicate
+        self.complexity_from_atom = defaultdict(dict)
         self.atoms_from_domain = defaultdict(list)
+        # Index the domain slots once so add_atom only visits streams that
+        # mention the new atom's predicate (instead of scanning all streams)
+        self.slots_from_predicate = defaultdict(list)
+        # Per stream: the (domain_idx, arg_idx) positions of each parameter and
+        # the groups of positions that share a parameter (the only combos that
+        # test_mapping could reject are ones violating these equalities)
+        self.shared_groups_from_stream = []
+        self.input_positions_from_stream = []
+        self.domain_from_stream = [] # The fixed domain heads of each stream
+        for s_idx, stream in enumerate(self.streams):
+            positions_from_param = defaultdict(list)
+            self.domain_from_stream.append(tuple(map(head_from_fact, stream.domain)))
+            for d_idx, domain_atom in enumerate(self.domain_from_stream[s_idx]):
+                # The constant-pinned positions of the domain fact are static,
+                # so matching an atom reduces to a few equality comparisons
+                constants = tuple((a_idx, arg) for a_idx, arg in enumerate(domain_atom.args)
+                                  if not is_parameter(arg))
+                siblings = tuple(d2_idx for d2_idx in range(len(stream.domain))
+                                 if d2_idx != d_idx)
+                self.slots_from_predicate[domain_atom.function].append(
+                    (s_idx, d_idx, stream, len(domain_atom.args), constants, siblings))
+                for a_idx, arg in enumerate(domain_atom.args):
+                    if is_parameter(arg):
+                        positions_from_param[arg].append((d_idx, a_idx))
+            self.shared_groups_from_stream.append(tuple(
+                tuple(positions) for positions in positions_from_param.values()
+                if len(positions) >= 2))
+            # Where in an accepted combo each input object lives: one index
+            # pull per input, no intermediate mapping dict
+            self.input_positions_from_stream.append(tuple(
+                positions_from_param[param][0] for param in stream.inputs))
         for stream in self.streams:
             if not stream.domain:
                 assert not stream.inputs
-                self.push_instance(stream.get_instance([]))
-        for atom, node in evaluations.items():
-            self.add_atom(atom, node.complexity)
+                self._add_instance(stream.get_instance([]))
+        self.add_atoms((atom, node.complexity) for atom, node in evaluations.items())
         # TODO: revisit deque and add functions to front
         # TODO: record the stream instances or results?
 
@@ -59,10 +111,17 @@ class Instantiator(Sized): # Dynamic Instantiator
         return len(self.queue)
 
     def compute_complexity(self, instance):
-        domain_complexity = COMPLEXITY_OP([self.complexity_from_atom[head_from_fact(f)]
+        domain_complexity = COMPLEXITY_OP([self.complexity_from_atom[get_prefix(f)][get_args(f)]
                                            for f in instance.get_domain()] + [0])
         return domain_complexity + instance.external.get_complexity(instance.num_calls)
 
+    def _add_instance(self, instance):
+        if instance in self.seen_instances:
+            return False
+        self.seen_instances[instance] = None
+        self.push_instance(instance)
+        return True
+
     def push_instance(self, instance):
         # TODO: flush stale priorities?
         complexity = self.compute_complexity(instance)
@@ -82,54 +141,92 @@ class Instantiator(Sized): # Dynamic Instantiator
 
     #########################
 
-    def _add_combinations(self, stream, atoms):
-        if not all(atoms):
-            return
-        domain = list(map(head_from_fact, stream.domain))
+    def _add_combinations(self, s_idx, stream, atoms):
+        # This matcher runs once per candidate combo; bind the hot names to
+        # locals and inline the shared-group test so each iteration avoids
+        # attribute lookups and method-call dispatch
+        shared_groups = self.shared_groups_from_stream[s_idx]
+        input_positions = self.input_positions_from_stream[s_idx]
+        get_instance = stream.get_instance
+        add_instance = self._add_instance
+        num_instances = 0
         # Most constrained variable/atom to least constrained
         for combo in product(*atoms):
-            mapping = test_mapping(domain, combo)
-            if mapping is not None:
-                input_objects = safe_apply_mapping(stream.inputs, mapping)
-                self.push_instance(stream.get_instance(input_objects))
-
-    def _add_combinations_relation(self, stream, atoms):
-        if not all(atoms):
-            return
+            for group in shared_groups:
+                d_idx, a_idx = group[0]
+                ref = combo[d_idx].args[a_idx]
+                # Interned Objects make equality an identity test
+                if any(combo[d2_idx].args[a2_idx] is not ref for d2_idx, a2_idx in group[1:]):
+                    break # Rejected: no dict is built for this combo
+            else:
+                input_objects = tuple(combo[d_idx].args[a_idx]
+                                      for d_idx, a_idx in input_positions)
+                num_instances += add_instance(get_instance(input_objects))
+                if num_instances >= self.max_instances_per_call:
+                    return
+
+    def _add_combinations_relation(self, s_idx, stream, atoms):
         # TODO: might be a bug here?
-        domain = list(map(head_from_fact, stream.domain))
-        # TODO: compute this first?
+        domain = self.domain_from_stream[s_idx]
         relations = [Relation(filter(is_parameter, domain[index].args),
                               [tuple(a for a, b in safe_zip(atom.args, domain[index].args)
                                      if is_parameter(b)) for atom in atoms[index]])
                      for index in compute_order(domain, atoms)]
         solution = solve_satisfaction(relations)
+        num_instances = 0
         for element in solution.body:
             mapping = solution.get_mapping(element)
             input_objects = safe_apply_mapping(stream.inputs, mapping)
-            self.push_instance(stream.get_instance(input_objects))
+            num_instances += self._add_instance(stream.get_instance(input_objects))
+            if num_instances >= self.max_instances_per_call:
+                return
 
     def _add_new_instances(self, new_atom):
-        for s_idx, stream in enumerate(self.streams):
-            for d_idx, domain_fact in enumerate(stream.domain):
-                domain_atom = head_from_fact(domain_fact)
-                if is_instance(new_atom, domain_atom):
-                    # TODO: handle domain constants more intelligently
-                    self.atoms_from_domain[s_idx, d_idx].append(new_atom)
-                    atoms = [self.atoms_from_domain[s_idx, d2_idx] if d_idx != d2_idx else [new_atom]
-                              for d2_idx in range(len(stream.domain))]
-                    if USE_RELATION:
-                        self._add_combinations_relation(stream, atoms)
-                    else:
-                        self._add_combinations(stream, atoms)
+        # Delta enumeration: each call pins new_atom at the single slot (s_idx, d_idx)
+        # it was just appended to, so every combination containing new_atom is
+        # produced exactly once and combinations without it are never revisited
+        atoms_from_domain = self.atoms_from_domain
+        for s_idx, d_idx, stream, arity, constants, siblings in self.slots_from_predicate[new_atom.function]:
+            args = new_atom.args
+            # Objects are interned by their registries, so identity compares suffice
+            if (len(args) == arity) and not any(args[a_idx] is not value for a_idx, value in constants):
+                # TODO: handle domain constants more intelligently
+                atoms_from_domain[s_idx, d_idx].append(new_atom)
+                # Until every sibling slot has a candidate, no combination
+                # exists; skip before building the per-slot lists
+                if any(not atoms_from_domain[s_idx, d2_idx] for d2_idx in siblings):
+                    continue
+                atoms = [atoms_from_domain[s_idx, d2_idx] if d_idx != d2_idx else [new_atom]
+                          for d2_idx in range(len(stream.domain))]
+                if USE_RELATION:
+                    self._add_combinations_relation(s_idx, stream, atoms)
+                else:
+                    self._add_combinations(s_idx, stream, atoms)
 
     def add_atom(self, atom, complexity):
         if not is_atom(atom):
             return False
         head = atom.head
-        if head in self.complexity_from_atom:
-            assert self.complexity_from_atom[head] <= complexity
+        complexity_from_args = self.complexity_from_atom[head.function]
+        if head.args in complexity_from_args:
+            assert complexity_from_args[head.args] <= complexity
             return False
-        self.complexity_from_atom[head] = complexity
+        complexity_from_args[head.args] = complexity
         self._add_new_instances(head)
         return True
+
+    def add_atoms(self, atoms_with_complexity):
+        # Group a batch of atoms by predicate so consecutive insertions walk
+        # the same slot bucket while it is hot. The per-predicate batches are
+        # independent, but dispatching them to a process pool does not pay
+        # off here: workers would need the global Object registries and the
+        # shared priority queue serialized across the IPC boundary
+        batch_from_predicate = defaultdict(list)
+        for atom, complexity in atoms_with_complexity:
+            if is_atom(atom):
+                batch_from_predicate[atom.head.function].append((atom, complexity))
+        new_atoms = False
+        for batch in batch_from_predicate.values():
+            for atom, complexity in batch:
+                new_atoms |= self.add_atom(atom, complexity)
+        return new_atoms
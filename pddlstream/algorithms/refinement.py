@@ -54,9 +54,9 @@ def prune_high_effort_streams(streams, max_effort=INF, **effort_args):
 def optimistic_process_streams(evaluations, streams, complexity_limit=INF, **effort_args):
     optimistic_streams = prune_high_effort_streams(streams, **effort_args)
     instantiator = Instantiator(optimistic_streams)
-    for evaluation, node in evaluations.items():
-        if node.complexity <= complexity_limit:
-            instantiator.add_atom(evaluation, node.complexity)
+    instantiator.add_atoms((evaluation, node.complexity)
+                           for evaluation, node in evaluations.items()
+                           if node.complexity <= complexity_limit)
     results = []
     while instantiator and (instantiator.min_complexity() <= complexity_limit):
         results.extend(optimistic_process_instance(instantiator, instantiator.pop_stream()))
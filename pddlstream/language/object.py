@@ -11,6 +11,9 @@ OPT_PREFIX = '#'
 PREFIX_LEN = 1
 
 class Object(object):
+    # Instances are interned: from_value/from_id/from_name return the one
+    # canonical Object per underlying value, and no __eq__ is defined, so
+    # equality, hashing, and identity comparison all coincide
     _prefix = 'v'
     _obj_from_id = {}
     _obj_from_value = {}